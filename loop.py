@@ -1,23 +1,98 @@
 import streamlit as st
 import sqlite3
-import qrcode
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import json
-import cv2
-from pyzbar.pyzbar import decode
 from PIL import Image
 import io
-import pandas as pd
-import random
 import numpy as np
 import string
-# Initialize database connection
-def init_db():
-    conn = sqlite3.connect("pallets.db")
+
+# Characters used for the random batch ID suffix
+_ALPHABET = np.frombuffer((string.ascii_uppercase + string.digits).encode(), dtype=np.uint8)
+
+# Columns shown in the home page's recent products table
+RECENT_COLUMNS = ("batch_id", "product_name", "company", "level", "status")
+
+# Write statements, kept as constants so each one has a single cached prepared form
+SQL_INSERT_PRODUCT = """
+INSERT INTO products (
+    batch_id, product_name, company, level,
+    deadline, stock_percent, status, last_updated
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_UPDATE_STOCK = "UPDATE products SET stock_percent = ?, last_updated = ? WHERE batch_id = ?"
+SQL_UPDATE_LEVEL = "UPDATE products SET level = ?, last_updated = ? WHERE batch_id = ?"
+SQL_UPDATE_STATUS = "UPDATE products SET status = ?, last_updated = ? WHERE batch_id = ?"
+SQL_INSERT_TXLOG = """
+INSERT INTO transaction_logs (
+    batch_id, operation, quantity_change,
+    previous_stock, new_stock, timestamp
+) VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+# Shared database connection, reused across Streamlit reruns
+@st.cache_resource
+def get_conn():
+    conn = sqlite3.connect("pallets.db", check_same_thread=False, cached_statements=128)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS products (
+        batch_id TEXT PRIMARY KEY,
+        product_name TEXT NOT NULL,
+        company TEXT NOT NULL,
+        level TEXT CHECK(level IN ('Raw', 'Processing', 'Finished', 'Shipped')),
+        deadline DATE NOT NULL,
+        stock_percent INTEGER CHECK(stock_percent BETWEEN 0 AND 100),
+        status TEXT DEFAULT 'Pending',
+        last_updated TEXT
+    );
+    CREATE TABLE IF NOT EXISTS transaction_logs (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT,
+        operation TEXT,
+        quantity_change INTEGER,
+        previous_stock INTEGER,
+        new_stock INTEGER,
+        timestamp TEXT,
+        FOREIGN KEY(batch_id) REFERENCES products(batch_id)
+    );
+
+    -- Indexes for the home page and report queries
+    CREATE INDEX IF NOT EXISTS idx_products_lastupdated ON products(last_updated DESC);
+    CREATE INDEX IF NOT EXISTS idx_products_deadline ON products(deadline);
+    CREATE INDEX IF NOT EXISTS idx_products_status ON products(status, deadline);
+    CREATE INDEX IF NOT EXISTS idx_products_level ON products(level, deadline);
+    CREATE INDEX IF NOT EXISTS idx_products_stock ON products(stock_percent) WHERE stock_percent < 20;
+    """)
     return conn
 
 
+# Serializes write transactions on the shared connection across session threads
+@st.cache_resource
+def get_write_lock():
+    return threading.Lock()
+
+
+# Read-only connection for pages that only query
+@st.cache_resource
+def get_ro_conn():
+    get_conn()  # make sure the database and schema exist first
+    conn = sqlite3.connect("file:pallets.db?mode=ro", uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+# Worker threads for QR rendering, shared across reruns
+@st.cache_resource
+def get_qr_pool():
+    return ThreadPoolExecutor(max_workers=2)
+
+
 # Initialize session state
 if 'page' not in st.session_state:
     st.session_state.page = "home"
@@ -45,21 +120,39 @@ def home_page():
     st.markdown("---")
 
     # Show recent products
-    conn = init_db()
-    recent_products = pd.read_sql("""
+    conn = get_ro_conn()
+    rows = conn.execute("""
     SELECT batch_id, product_name, company, level, status 
     FROM products 
     ORDER BY last_updated DESC 
     LIMIT 5
-    """, conn)
+    """).fetchall()
 
-    if not recent_products.empty:
+    if rows:
         st.subheader("Recently Updated Products")
-        st.dataframe(recent_products, hide_index=True)
+        st.dataframe([dict(zip(RECENT_COLUMNS, row)) for row in rows], hide_index=True)
     else:
         st.info("No products found. Register a new product to get started.")
 
-    conn.close()
+
+# Render a QR code for the given payload as PNG bytes
+def _encode_qr(qr_data):
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(json.dumps(qr_data))
+    qr.make(fit=True)
+
+    # Render the module matrix (border included) as a 1-bit image
+    matrix = np.asarray(qr.get_matrix(), dtype=bool)
+    size = matrix.shape[0]
+    img = Image.frombytes("1", (size, size), np.packbits(~matrix, axis=1).tobytes())
+    img = img.resize((size * qr.box_size, size * qr.box_size), Image.NEAREST)
+
+    # Save QR code to bytes
+    with io.BytesIO() as buf:
+        img.save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
 
 
 # Register Product Page
@@ -92,44 +185,32 @@ def register_page():
             # Generate batch ID
             company_code = company[:3].upper()
             product_code = product_name[:3].upper()
-            timestamp = datetime.now().strftime("%y%m%d")
-            random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
+            now = datetime.now()
+            timestamp = now.strftime("%y%m%d")
+            rng = np.random.default_rng()
+            random_str = rng.choice(_ALPHABET, size=4).tobytes().decode()
             batch_id = f"{company_code}-{product_code}-{timestamp}-{random_str}"
 
             try:
-                conn = init_db()
-                cursor = conn.cursor()
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                cursor.execute("""
-                INSERT INTO products (
-                    batch_id, product_name, company, level, 
-                    deadline, stock_percent, status, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    batch_id, product_name, company, level,
-                    deadline.strftime("%Y-%m-%d"), stock_percent, "Pending", timestamp
-                ))
-
-                # Generate QR code
+                conn = get_conn()
+                timestamp = now.isoformat(sep=" ", timespec="seconds")
+
+                # Generate QR code in the background while the product is saved
                 qr_data = {
                     "batch_id": batch_id,
                     "product_name": product_name,
                     "company": company
                 }
+                fut = get_qr_pool().submit(_encode_qr, qr_data)
 
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data(json.dumps(qr_data))
-                qr.make(fit=True)
-                img = qr.make_image(fill="black", back_color="white")
+                with get_write_lock(), conn:
+                    conn.execute(SQL_INSERT_PRODUCT, (
+                        batch_id, product_name, company, level,
+                        deadline.strftime("%Y-%m-%d"), stock_percent, "Pending", timestamp
+                    ))
+                load_report.clear()
 
-                # Save QR code to bytes
-                img_bytes = io.BytesIO()
-                img.save(img_bytes, format="PNG")
-                img_bytes.seek(0)
-
-                conn.commit()
-                conn.close()
+                img_bytes = fut.result()
 
                 st.success(f"Product registered successfully! Batch ID: {batch_id}")
 
@@ -148,6 +229,22 @@ def register_page():
                 st.error(f"Error registering product: {e}")
 
 
+# Decode the first QR code in a grayscale image, or None if there is none
+def read_qr(gray):
+    import cv2
+    from pyzbar.pyzbar import decode
+
+    data, _, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+    if data:
+        return data
+
+    # Fall back to zbar when OpenCV cannot read the code
+    detected_qrs = decode(gray)
+    if detected_qrs:
+        return detected_qrs[0].data.decode('utf-8')
+    return None
+
+
 # QR Code Scanning Page
 def scan_page():
     st.title("📷 Scan QR Code")
@@ -156,33 +253,57 @@ def scan_page():
     uploaded_file = st.file_uploader("Upload QR Code Image", type=["png", "jpg", "jpeg"])
 
     if uploaded_file is not None:
-        # Read image file
-        file_bytes = uploaded_file.getvalue()
-        img = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+        import pandas as pd
 
-        # Detect QR code
-        detected_qrs = decode(img)
+        # Decode the QR code only once per upload; reruns reuse the batch ID
+        scan_key = uploaded_file.file_id
+        if st.session_state.get('scanned_file') != scan_key:
+            import cv2
 
-        if not detected_qrs:
-            st.error("No QR code found in the image!")
-            return
+            # Read image file
+            file_bytes = uploaded_file.getvalue()
+            gray = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
 
-        try:
-            qr_data = json.loads(detected_qrs[0].data.decode('utf-8'))
-            batch_id = qr_data.get("batch_id")
+            if gray is None:
+                st.error("Could not read the uploaded image!")
+                return
+
+            # Detect QR code on a copy capped at 1024px, then retry at full size
+            scale = max(1.0, max(gray.shape[:2]) / 1024.0)
+            raw_data = None
+            if scale > 1.0:
+                small = cv2.resize(gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+                raw_data = read_qr(small)
+            if not raw_data:
+                raw_data = read_qr(gray)
+
+            if not raw_data:
+                st.error("No QR code found in the image!")
+                return
+
+            try:
+                batch_id = json.loads(raw_data).get("batch_id")
+            except Exception as e:
+                st.error(f"Error processing QR code: {e}")
+                return
 
             if not batch_id:
                 st.error("Invalid QR code data: missing batch_id")
                 return
 
+            st.session_state['scanned_file'] = scan_key
+            st.session_state['scanned_batch_id'] = batch_id
+
+        batch_id = st.session_state['scanned_batch_id']
+
+        try:
             st.success(f"Successfully scanned QR code for batch: {batch_id}")
 
             # Show product details
-            conn = init_db()
-            product = pd.read_sql(f"""
+            product = pd.read_sql("""
             SELECT product_name, company, level, deadline, stock_percent, status 
-            FROM products WHERE batch_id = '{batch_id}'
-            """, conn)
+            FROM products WHERE batch_id = ?
+            """, get_ro_conn(), params=(batch_id,))
 
             if product.empty:
                 st.error("Batch ID not found in database!")
@@ -193,6 +314,7 @@ def scan_page():
 
             # Transaction options
             st.subheader("Transaction Options")
+            conn = get_conn()
             tab1, tab2, tab3 = st.tabs(["Update Stock", "Change Level", "Update Status"])
 
             with tab1:
@@ -212,33 +334,23 @@ def scan_page():
                             st.error("Stock must be between 0% and 100%")
                         else:
                             try:
-                                cursor = conn.cursor()
-                                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                                cursor.execute("""
-                                UPDATE products 
-                                SET stock_percent = ?, last_updated = ? 
-                                WHERE batch_id = ?
-                                """, (new_stock, timestamp, batch_id))
-
-                                # Log transaction
-                                cursor.execute("""
-                                INSERT INTO transaction_logs (
-                                    batch_id, operation, quantity_change, 
-                                    previous_stock, new_stock, timestamp
-                                ) VALUES (?, ?, ?, ?, ?, ?)
-                                """, (
-                                    batch_id, "Stock Update", change,
-                                    current_stock, new_stock, timestamp
-                                ))
-
-                                conn.commit()
+                                timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
+
+                                with get_write_lock(), conn:
+                                    conn.execute(SQL_UPDATE_STOCK, (new_stock, timestamp, batch_id))
+
+                                    # Log transaction
+                                    conn.execute(SQL_INSERT_TXLOG, (
+                                        batch_id, "Stock Update", change,
+                                        current_stock, new_stock, timestamp
+                                    ))
+                                load_report.clear()
+
                                 st.success(f"Stock updated to {new_stock}%")
-                                st.experimental_rerun()
+                                st.rerun()
 
                             except Exception as e:
                                 st.error(f"Error updating stock: {e}")
-                                conn.rollback()
 
             with tab2:
                 with st.form("level_form"):
@@ -251,22 +363,17 @@ def scan_page():
 
                     if st.form_submit_button("Update Level"):
                         try:
-                            cursor = conn.cursor()
-                            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
 
-                            cursor.execute("""
-                            UPDATE products 
-                            SET level = ?, last_updated = ? 
-                            WHERE batch_id = ?
-                            """, (new_level, timestamp, batch_id))
+                            with get_write_lock(), conn:
+                                conn.execute(SQL_UPDATE_LEVEL, (new_level, timestamp, batch_id))
+                            load_report.clear()
 
-                            conn.commit()
                             st.success(f"Level changed to {new_level}")
-                            st.experimental_rerun()
+                            st.rerun()
 
                         except Exception as e:
                             st.error(f"Error updating level: {e}")
-                            conn.rollback()
 
             with tab3:
                 with st.form("status_form"):
@@ -279,49 +386,30 @@ def scan_page():
 
                     if st.form_submit_button("Update Status"):
                         try:
-                            cursor = conn.cursor()
-                            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
 
-                            cursor.execute("""
-                            UPDATE products 
-                            SET status = ?, last_updated = ? 
-                            WHERE batch_id = ?
-                            """, (new_status, timestamp, batch_id))
+                            with get_write_lock(), conn:
+                                conn.execute(SQL_UPDATE_STATUS, (new_status, timestamp, batch_id))
+                            load_report.clear()
 
-                            conn.commit()
                             st.success(f"Status changed to {new_status}")
-                            st.experimental_rerun()
+                            st.rerun()
 
                         except Exception as e:
                             st.error(f"Error updating status: {e}")
-                            conn.rollback()
-
-            conn.close()
 
         except Exception as e:
             st.error(f"Error processing QR code: {e}")
 
 
-# Reports Page
-def reports_page():
-    st.title("📊 Product Reports")
-    st.markdown("---")
-
-    report_type = st.selectbox(
-        "Select Report Type",
-        [
-            "All Products",
-            "By Status",
-            "By Level",
-            "Critical Stock (<20%)",
-            "Upcoming Deadlines"
-        ]
-    )
+# Report data, cached per (report type, filter) for a short TTL
+@st.cache_data(ttl=30)
+def load_report(report_type, filter_value=None):
+    import pandas as pd
 
-    conn = init_db()
+    conn = get_ro_conn()
 
     if report_type == "All Products":
-        st.subheader("All Products")
         df = pd.read_sql("""
         SELECT batch_id, product_name, company, level, 
                deadline, stock_percent, status 
@@ -330,35 +418,24 @@ def reports_page():
         """, conn)
 
     elif report_type == "By Status":
-        status = st.selectbox(
-            "Select Status",
-            ["Pending", "In Progress", "Completed", "Delayed"]
-        )
-        st.subheader(f"Products with Status: {status}")
-        df = pd.read_sql(f"""
+        df = pd.read_sql("""
         SELECT batch_id, product_name, company, level, 
                deadline, stock_percent, status 
         FROM products 
-        WHERE status = '{status}'
+        WHERE status = ?
         ORDER BY deadline
-        """, conn)
+        """, conn, params=(filter_value,))
 
     elif report_type == "By Level":
-        level = st.selectbox(
-            "Select Production Level",
-            ["Raw", "Processing", "Finished", "Shipped"]
-        )
-        st.subheader(f"Products at Level: {level}")
-        df = pd.read_sql(f"""
+        df = pd.read_sql("""
         SELECT batch_id, product_name, company, level, 
                deadline, stock_percent, status 
         FROM products 
-        WHERE level = '{level}'
+        WHERE level = ?
         ORDER BY deadline
-        """, conn)
+        """, conn, params=(filter_value,))
 
     elif report_type == "Critical Stock (<20%)":
-        st.subheader("Products with Critical Stock (<20%)")
         df = pd.read_sql("""
         SELECT batch_id, product_name, company, level, 
                deadline, stock_percent, status 
@@ -368,19 +445,66 @@ def reports_page():
         """, conn)
 
     elif report_type == "Upcoming Deadlines":
-        st.subheader("Products with Upcoming Deadlines (Next 7 Days)")
         df = pd.read_sql("""
         SELECT batch_id, product_name, company, level, 
                deadline, stock_percent, status 
         FROM products 
-        WHERE deadline <= date('now', '+7 days')
+        WHERE deadline <= ?
         ORDER BY deadline
-        """, conn)
+        """, conn, params=(filter_value,))
 
     if not df.empty:
         # Format the deadline column
         df['deadline'] = pd.to_datetime(df['deadline']).dt.strftime('%Y-%m-%d')
 
+    return df
+
+
+# Reports Page
+def reports_page():
+    st.title("📊 Product Reports")
+    st.markdown("---")
+
+    report_type = st.selectbox(
+        "Select Report Type",
+        [
+            "All Products",
+            "By Status",
+            "By Level",
+            "Critical Stock (<20%)",
+            "Upcoming Deadlines"
+        ]
+    )
+
+    filter_value = None
+
+    if report_type == "All Products":
+        st.subheader("All Products")
+
+    elif report_type == "By Status":
+        filter_value = st.selectbox(
+            "Select Status",
+            ["Pending", "In Progress", "Completed", "Delayed"]
+        )
+        st.subheader(f"Products with Status: {filter_value}")
+
+    elif report_type == "By Level":
+        filter_value = st.selectbox(
+            "Select Production Level",
+            ["Raw", "Processing", "Finished", "Shipped"]
+        )
+        st.subheader(f"Products at Level: {filter_value}")
+
+    elif report_type == "Critical Stock (<20%)":
+        st.subheader("Products with Critical Stock (<20%)")
+
+    elif report_type == "Upcoming Deadlines":
+        st.subheader("Products with Upcoming Deadlines (Next 7 Days)")
+        filter_value = (date.today() + timedelta(days=7)).strftime("%Y-%m-%d")
+
+    df = load_report(report_type, filter_value)
+
+    if not df.empty:
         # Display as interactive table
         st.dataframe(
             df,
@@ -407,8 +531,6 @@ def reports_page():
     else:
         st.info("No products found matching the criteria.")
 
-    conn.close()
-
 
 # Main App
 def main():
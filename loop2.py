@@ -4,7 +4,6 @@ from datetime import datetime
 import qrcode
 import os
 import time
-from PIL import Image
 import webbrowser
 import cv2
 from pyzbar.pyzbar import decode
@@ -53,25 +52,23 @@ def generate_and_show_qr(pallet_id, item_name, quantity):
     qr.make(fit=True)
     img = qr.make_image(fill="black", back_color="white")
     filename = f"{pallet_id}.png"
-    img.save(filename)
+    img.save(filename, format="PNG", compress_level=1)
 
     # Show the QR code image
     print(f"\nQR code generated for pallet {pallet_id}")
     print(f"Item: {item_name}")
     print(f"Quantity: {quantity}")
 
-    # Open the image
-    img = Image.open(filename)
+    # Show the in-memory image instead of re-reading the saved file
     img.show()
 
     return filename
 
 
 # ---------- 3. LOGGING FUNCTION ----------
-def log_operation(conn, pallet_id, operation, qty_change, prev_qty, new_qty):
+def log_operation(conn, pallet_id, operation, qty_change, prev_qty, new_qty, timestamp):
     """Log the operation details"""
     cursor = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     cursor.execute("""
     INSERT INTO logs (pallet_id, operation, quantity_change, previous_quantity, new_quantity, timestamp)
     VALUES (?, ?, ?, ?, ?, ?)
@@ -109,15 +106,16 @@ def process_scan(qr_data):
         print("Invalid operation. Please enter 'entry' or 'exit'")
 
     with sqlite3.connect("pallets.db") as conn:
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
         # Get current quantity
         cursor.execute("SELECT quantity FROM pallets WHERE pallet_id = ?", (pallet_id,))
         row = cursor.fetchone()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
 
         if row:  # Existing pallet
-            current_qty = row[0]
+            current_qty = row["quantity"]
             qty_change = pallet_info["quantity"]
 
             if operation == "entry":
@@ -138,7 +136,7 @@ def process_scan(qr_data):
             """, (new_qty, timestamp, pallet_id))
 
             # Log operation
-            log_operation(conn, pallet_id, operation, qty_change, current_qty, new_qty)
+            log_operation(conn, pallet_id, operation, qty_change, current_qty, new_qty, timestamp)
 
             print(f"Previous quantity: {current_qty}")
             print(f"New quantity: {new_qty}")
@@ -156,7 +154,7 @@ def process_scan(qr_data):
             """, (pallet_id, pallet_info["item_name"], new_qty, timestamp))
 
             # Log operation
-            log_operation(conn, pallet_id, "initial entry", new_qty, 0, new_qty)
+            log_operation(conn, pallet_id, "initial entry", new_qty, 0, new_qty, timestamp)
 
             print(f"\nNew pallet registered with quantity: {new_qty}")
             print("Transaction completed successfully!")
@@ -168,6 +166,7 @@ def process_scan(qr_data):
 def view_logs():
     """Display transaction logs"""
     with sqlite3.connect("pallets.db") as conn:
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute("""
         SELECT log_id, pallet_id, operation, quantity_change, 
@@ -176,12 +175,13 @@ def view_logs():
         ORDER BY timestamp DESC
         LIMIT 20
         """)
-        logs = cursor.fetchall()
+
+        fmt = "{:<5} {:<10} {:<10} {:<8} {:<8} {:<8} {:<20}".format
 
         print("\n=== RECENT TRANSACTIONS ===")
-        print(f"{'ID':<5} {'Pallet':<10} {'Operation':<10} {'Change':<8} {'Previous':<8} {'New':<8} {'Timestamp':<20}")
-        for log in logs:
-            print(f"{log[0]:<5} {log[1]:<10} {log[2]:<10} {log[3]:<8} {log[4]:<8} {log[5]:<8} {log[6]:<20}")
+        print(fmt("ID", "Pallet", "Operation", "Change", "Previous", "New", "Timestamp"))
+        for log in cursor:
+            print(fmt(*log))
 
 
 # ---------- 6. SCAN QR CODE ----------
@@ -1,44 +1,137 @@
 import sqlite3
+import csv
 import json
+import orjson
 from datetime import datetime
-import qrcode
+import segno
 import os
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Quantity sign for each scan operation
+OPS = {"entry": 1, "exit": -1}
+
+# UPDATE ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35)
+
+# SQL statements, shared so the connection's statement cache reuses them
+SQL_SELECT_QTY = "SELECT quantity FROM pallets WHERE pallet_id = ?"
+SQL_UPDATE_PALLET = "UPDATE pallets SET quantity = ?, last_updated = ? WHERE pallet_id = ?"
+SQL_ADD_QTY_RETURNING = """
+UPDATE pallets SET quantity = quantity + ?1, last_updated = ?2
+WHERE pallet_id = ?3 AND quantity + ?1 >= 0
+RETURNING quantity - ?1, quantity
+"""
+SQL_INSERT_PALLET = "INSERT INTO pallets (pallet_id, item_name, quantity, last_updated) VALUES (?, ?, ?, ?)"
+SQL_INSERT_LOG = """
+INSERT INTO logs (pallet_id, operation, quantity_change, previous_quantity, new_quantity, timestamp)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_VIEW_LOGS = """
+SELECT printf('%-5d %-!10s %-!10s %-8d %-8d %-8d %-!20s',
+              log_id, pallet_id, operation, quantity_change,
+              previous_quantity, new_quantity, timestamp)
+FROM logs
+ORDER BY log_id DESC
+LIMIT 20
+"""
+SQL_VIEW_PALLET_LOGS = """
+SELECT printf('%-5d %-!10s %-!10s %-8d %-8d %-8d %-!20s',
+              log_id, pallet_id, operation, quantity_change,
+              previous_quantity, new_quantity, timestamp)
+FROM logs
+WHERE pallet_id = ?
+ORDER BY log_id DESC
+LIMIT 20
+"""
+
+
+# ---------- 0. HELPERS ----------
+def _prompt(msg):
+    """Read one line from stdin like input(), without going through readline"""
+    sys.stdout.write(msg)
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
 
 
 # ---------- 1. DATABASE SETUP ----------
+_CONN = None
+_INITIALIZED = False
+
+
+def _connect():
+    """Open a connection to the pallets database"""
+    conn = sqlite3.connect("pallets.db", check_same_thread=False, isolation_level=None,
+                           cached_statements=256)
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def get_conn():
+    """Return the shared database connection, opening it on first use"""
+    global _CONN
+    if _CONN is None:
+        _CONN = _connect()
+    return _CONN
+
+
 def init_db():
     """Initialize database with both pallets and logs tables"""
-    with sqlite3.connect("pallets.db") as conn:
-        cursor = conn.cursor()
-
-        # Create pallets table if not exists
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS pallets (
-            pallet_id TEXT PRIMARY KEY,
-            item_name TEXT,
-            quantity INTEGER,
-            last_updated TEXT
-        )
-        """)
-
-        # Create logs table if not exists
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pallet_id TEXT,
-            operation TEXT,
-            quantity_change INTEGER,
-            previous_quantity INTEGER,
-            new_quantity INTEGER,
-            timestamp TEXT,
-            FOREIGN KEY(pallet_id) REFERENCES pallets(pallet_id)
-        )
-        """)
-        conn.commit()
+    global _INITIALIZED
+    if _INITIALIZED:
+        return
+
+    conn = get_conn()
+    cursor = conn.cursor()
+
+    # WAL is stored in the database file, so later connections inherit it;
+    # _connect() already sets busy_timeout and synchronous
+    cursor.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    """)
+
+    # Create pallets table if not exists
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pallets (
+        pallet_id TEXT PRIMARY KEY,
+        item_name TEXT,
+        quantity INTEGER,
+        last_updated TEXT
+    )
+    """)
+
+    # Create logs table if not exists
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pallet_id TEXT,
+        operation TEXT,
+        quantity_change INTEGER,
+        previous_quantity INTEGER,
+        new_quantity INTEGER,
+        timestamp TEXT,
+        FOREIGN KEY(pallet_id) REFERENCES pallets(pallet_id)
+    )
+    """)
+
+    # Per-pallet log history
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_pallet ON logs(pallet_id, log_id DESC)")
+
+    _INITIALIZED = True
 
 
 # ---------- 2. QR GENERATION ----------
+# QR images are rendered off the menu thread
+_QR_POOL = ThreadPoolExecutor(max_workers=2)
+
+
 def generate_qr(pallet_id, item_name, quantity):
     """Generate QR code for a pallet"""
     data = {
@@ -46,116 +139,190 @@ def generate_qr(pallet_id, item_name, quantity):
         "item_name": item_name,
         "quantity": quantity
     }
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(json.dumps(data))
-    qr.make(fit=True)
-    img = qr.make_image(fill="black", back_color="white")
-    img.save(f"{pallet_id}.png")
-    print(f"QR code generated for pallet {pallet_id}")
+    qr = segno.make_qr(json.dumps(data, separators=(",", ":")), error="m")
+    qr.save(f"{pallet_id}.png", scale=10, border=5)
+
+
+def _report_qr_error(future):
+    """Print the error from a failed background QR generation"""
+    if future.exception() is not None:
+        print(f"Error generating QR code: {future.exception()}")
 
 
 # ---------- 3. LOGGING FUNCTION ----------
-def log_operation(conn, pallet_id, operation, qty_change, prev_qty, new_qty):
+def log_operations_bulk(conn, rows):
+    """Log many (pallet_id, operation, qty_change, prev_qty, new_qty, timestamp) rows at once"""
+    # Join the caller's transaction if there is one, otherwise open our own
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN")
+    try:
+        conn.executemany(SQL_INSERT_LOG, rows)
+    except Exception:
+        if own_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    if own_transaction:
+        conn.execute("COMMIT")
+
+
+def log_operation(conn, pallet_id, operation, qty_change, prev_qty, new_qty, timestamp):
     """Log the operation details"""
-    cursor = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("""
-    INSERT INTO logs (pallet_id, operation, quantity_change, previous_quantity, new_quantity, timestamp)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, (pallet_id, operation, qty_change, prev_qty, new_qty, timestamp))
-    conn.commit()
+    log_operations_bulk(conn, [(pallet_id, operation, qty_change, prev_qty, new_qty, timestamp)])
 
 
 # ---------- 4. PROCESS SCANNED QR ----------
 def process_scan(qr_data):
     """Process scanned QR code with entry/exit selection"""
-    pallet_info = json.loads(qr_data)
+    pallet_info = orjson.loads(qr_data)
     pallet_id = pallet_info["pallet_id"]
 
     print(f"\nScanned Pallet: {pallet_id}")
     print(f"Item: {pallet_info['item_name']}")
 
     while True:
-        operation = input("Enter operation (entry/exit): ").strip().lower()
-        if operation in ("entry", "exit"):
+        operation = _prompt("Enter operation (entry/exit): ").strip().lower()
+        sign = OPS.get(operation)
+        if sign is not None:
             break
         print("Invalid operation. Please enter 'entry' or 'exit'")
 
-    with sqlite3.connect("pallets.db") as conn:
-        cursor = conn.cursor()
+    conn = get_conn()
+    cursor = conn.cursor()
 
-        # Get current quantity
-        cursor.execute("SELECT quantity FROM pallets WHERE pallet_id = ?", (pallet_id,))
-        row = cursor.fetchone()
+    # Read, update and log inside one write transaction
+    conn.execute("BEGIN IMMEDIATE")
+    try:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        qty_change = pallet_info["quantity"]
+        delta = sign * qty_change
+
+        # Apply the change and read back (previous, new) quantity in one statement
+        row = None
+        if _HAS_RETURNING:
+            cursor.execute(SQL_ADD_QTY_RETURNING, (delta, timestamp, pallet_id))
+            rows = cursor.fetchall()
+            row = rows[0] if rows else None
+
+        # Older SQLite, missing pallet or not enough stock: read the row explicitly
+        if row is None:
+            cursor.execute(SQL_SELECT_QTY, (pallet_id,))
+            existing = cursor.fetchone()
+            if existing:
+                current_qty = existing[0]
+                if current_qty + delta < 0:
+                    print(f"Warning: Not enough items (Current: {current_qty}, Trying to remove: {qty_change})")
+                    conn.execute("ROLLBACK")
+                    return
+                row = (current_qty, current_qty + delta)
+                cursor.execute(SQL_UPDATE_PALLET, (row[1], timestamp, pallet_id))
 
         if row:  # Existing pallet
-            current_qty = row[0]
-            qty_change = pallet_info["quantity"]
+            current_qty, new_qty = row
 
-            if operation == "entry":
-                new_qty = current_qty + qty_change
+            if sign > 0:
                 print(f"Adding {qty_change} items to pallet {pallet_id}")
-            else:  # exit
-                if current_qty < qty_change:
-                    print(f"Warning: Not enough items (Current: {current_qty}, Trying to remove: {qty_change})")
-                    return
-                new_qty = current_qty - qty_change
+            else:
                 print(f"Removing {qty_change} items from pallet {pallet_id}")
 
-            # Update pallet
-            cursor.execute("""
-                UPDATE pallets 
-                SET quantity = ?, last_updated = ? 
-                WHERE pallet_id = ?
-            """, (new_qty, timestamp, pallet_id))
-
             # Log operation
-            log_operation(conn, pallet_id, operation, qty_change, current_qty, new_qty)
+            log_operation(conn, pallet_id, operation, qty_change, current_qty, new_qty, timestamp)
+            conn.execute("COMMIT")
 
             print(f"Updated quantity: {new_qty}")
             print(f"Previous quantity: {current_qty}")
 
         else:  # New pallet
-            if operation == "exit":
+            if sign < 0:
                 print("Cannot exit - pallet doesn't exist in system!")
+                conn.execute("ROLLBACK")
                 return
 
             new_qty = pallet_info["quantity"]
-            cursor.execute("""
-                INSERT INTO pallets (pallet_id, item_name, quantity, last_updated)
-                VALUES (?, ?, ?, ?)
-            """, (pallet_id, pallet_info["item_name"], new_qty, timestamp))
+            cursor.execute(SQL_INSERT_PALLET, (pallet_id, pallet_info["item_name"], new_qty, timestamp))
 
             # Log operation
-            log_operation(conn, pallet_id, "initial entry", new_qty, 0, new_qty)
+            log_operation(conn, pallet_id, "initial entry", new_qty, 0, new_qty, timestamp)
+            conn.execute("COMMIT")
 
             print(f"New pallet registered with quantity: {new_qty}")
 
-        conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
 
 
 # ---------- 5. VIEW LOGS ----------
-def view_logs():
-    """Display transaction logs"""
-    with sqlite3.connect("pallets.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-        SELECT log_id, pallet_id, operation, quantity_change, 
-               previous_quantity, new_quantity, timestamp 
-        FROM logs 
-        ORDER BY timestamp DESC
-        LIMIT 20
-        """)
-        logs = cursor.fetchall()
-
-        print("\n=== RECENT TRANSACTIONS ===")
-        print(f"{'ID':<5} {'Pallet':<10} {'Operation':<10} {'Change':<8} {'Previous':<8} {'New':<8} {'Timestamp':<20}")
-        for log in logs:
-            print(f"{log[0]:<5} {log[1]:<10} {log[2]:<10} {log[3]:<8} {log[4]:<8} {log[5]:<8} {log[6]:<20}")
-
-
-# ---------- 6. MAIN MENU ----------
+def view_logs(pallet_id=None):
+    """Display transaction logs, optionally for a single pallet"""
+    conn = get_conn()
+    cursor = conn.cursor()
+    if pallet_id is None:
+        cursor.execute(SQL_VIEW_LOGS)
+    else:
+        cursor.execute(SQL_VIEW_PALLET_LOGS, (pallet_id,))
+
+    # Rows come back already formatted; write the whole table in one call
+    lines = [
+        "\n=== RECENT TRANSACTIONS ===",
+        f"{'ID':<5} {'Pallet':<10} {'Operation':<10} {'Change':<8} {'Previous':<8} {'New':<8} {'Timestamp':<20}",
+    ]
+    lines += [line for (line,) in cursor]
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+# ---------- 6. BULK IMPORT ----------
+def bulk_import(scans):
+    """Record many (pallet_id, item_name, quantity) entries in one transaction"""
+    conn = get_conn()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        quantities = {}  # running quantity per pallet
+        new_items = {}   # item name for pallets created by this import
+        log_rows = []
+
+        for pallet_id, item_name, quantity in scans:
+            # Entries only add stock, like an entry scan in process_scan
+            if quantity < 0:
+                print(f"Skipping pallet {pallet_id}: quantity cannot be negative ({quantity})")
+                continue
+
+            if pallet_id not in quantities:
+                row = conn.execute(SQL_SELECT_QTY, (pallet_id,)).fetchone()
+                if row is None:  # New pallet
+                    new_items[pallet_id] = item_name
+                    quantities[pallet_id] = quantity
+                    log_rows.append((pallet_id, "initial entry", quantity, 0, quantity, timestamp))
+                    continue
+                quantities[pallet_id] = row[0]
+
+            prev_qty = quantities[pallet_id]
+            quantities[pallet_id] = prev_qty + quantity
+            log_rows.append((pallet_id, "entry", quantity, prev_qty, prev_qty + quantity, timestamp))
+
+        conn.executemany(SQL_INSERT_PALLET, [
+            (pallet_id, item_name, quantities[pallet_id], timestamp)
+            for pallet_id, item_name in new_items.items()
+        ])
+        conn.executemany(SQL_UPDATE_PALLET, [
+            (quantity, timestamp, pallet_id)
+            for pallet_id, quantity in quantities.items() if pallet_id not in new_items
+        ])
+        log_operations_bulk(conn, log_rows)
+        conn.execute("COMMIT")
+
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+    return len(log_rows)
+
+
+# ---------- 7. MAIN MENU ----------
 def main_menu():
     """Display main menu and handle user input"""
     init_db()
@@ -166,20 +333,22 @@ def main_menu():
         print("2. Scan QR Code")
         print("3. View Transaction Logs")
         print("4. Exit")
+        print("5. Bulk Import")
 
-        choice = input("Enter your choice (1-4): ")
+        choice = _prompt("Enter your choice (1-5): ")
 
         if choice == "1":
-            pallet_id = input("Enter pallet ID: ")
-            item_name = input("Enter item name: ")
-            quantity = int(input("Enter initial quantity: "))
-            generate_qr(pallet_id, item_name, quantity)
+            pallet_id = _prompt("Enter pallet ID: ")
+            item_name = _prompt("Enter item name: ")
+            quantity = int(_prompt("Enter initial quantity: "))
+            _QR_POOL.submit(generate_qr, pallet_id, item_name, quantity).add_done_callback(_report_qr_error)
+            print(f"QR code for pallet {pallet_id} queued")
 
         elif choice == "2":
             # Simulated QR scan - in real use, you'd get this from a QR scanner
-            pallet_id = input("Enter pallet ID (or scan QR): ")
-            item_name = input("Enter item name: ")
-            quantity = int(input("Enter quantity: "))
+            pallet_id = _prompt("Enter pallet ID (or scan QR): ")
+            item_name = _prompt("Enter item name: ")
+            quantity = int(_prompt("Enter quantity: "))
 
             qr_content = json.dumps({
                 "pallet_id": pallet_id,
@@ -196,10 +365,37 @@ def main_menu():
             print("Exiting system...")
             break
 
+        elif choice == "5":
+            # CSV file with pallet_id, item_name, quantity columns
+            filepath = _prompt("Enter CSV file path: ").strip()
+            if not os.path.exists(filepath):
+                print(f"Error: File not found at {filepath}")
+                continue
+
+            try:
+                with open(filepath, newline="") as f:
+                    scans = [
+                        (row["pallet_id"], row["item_name"], int(row["quantity"]))
+                        for row in csv.DictReader(f)
+                    ]
+            except OSError as e:
+                print(f"Error: Could not read {filepath} ({e})")
+                continue
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Error: Invalid CSV file ({e})")
+                print("Expected columns: pallet_id, item_name, quantity (whole number)")
+                continue
+
+            count = bulk_import(scans)
+            print(f"Imported {count} entries from {filepath}")
+
         else:
             print("Invalid choice. Please try again.")
 
+    # Let pending QR images finish writing before the program exits
+    _QR_POOL.shutdown(wait=True)
+
 
-# ---------- 7. RUN APPLICATION ----------
+# ---------- 8. RUN APPLICATION ----------
 if __name__ == "__main__":
     main_menu()
\ No newline at end of file